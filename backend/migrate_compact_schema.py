@@ -0,0 +1,186 @@
+"""Migrate existing documents to the compact storage schema used by server.py.
+
+Old documents carry a string `id` next to an ObjectId `_id`, string references
+and ISO date strings. This rewrites them in batches so the id becomes a binary
+UUID `_id`, references become binary UUIDs and dates become native datetimes.
+Only documents that still have an ObjectId `_id` are touched, so the script can
+be stopped and re-run at any point.
+
+Afterwards car_health documents without a maintenance schedule get one computed
+from their car's last_service_date, so the maintenance scheduler picks them up.
+
+Run it before deploying the new backend:
+
+    cd backend && python migrate_compact_schema.py --batch-size 500 [--compact] [--dry-run]
+
+Collection, index and working-set sizes are printed before and after.
+"""
+import os
+import argparse
+from typing import Tuple
+
+from pymongo import MongoClient, ReplaceOne, DeleteOne, UpdateOne
+from pymongo.errors import OperationFailure
+from fastapi import HTTPException
+
+from server import (
+    INDEXES, OBSOLETE_INDEXES, User, Car, CarHealth, ServiceBooking, Event, EventRSVP, WaitlistEntry,
+    maintenance_due_dates, maintenance_schedule
+)
+
+COLLECTIONS = {
+    "users": User,
+    "cars": Car,
+    "car_health": CarHealth,
+    "bookings": ServiceBooking,
+    "events": Event,
+    "event_rsvps": EventRSVP,
+    "event_waitlist": WaitlistEntry,
+}
+
+def measure(database) -> dict:
+    sizes = {}
+    for name in COLLECTIONS:
+        try:
+            stats = next(database[name].aggregate([{"$collStats": {"storageStats": {}}}]), {}).get("storageStats", {})
+        except OperationFailure:
+            stats = {}  # collection does not exist yet
+        sizes[name] = {
+            "count": stats.get("count", 0),
+            "avg_doc_bytes": stats.get("avgObjSize", 0),
+            "data_bytes": stats.get("size", 0),
+            "storage_bytes": stats.get("storageSize", 0),
+            "index_bytes": stats.get("totalIndexSize", 0),
+            "indexes": len(stats.get("indexSizes", {})),
+            "cached_bytes": stats.get("wiredTiger", {}).get("cache", {}).get("bytes currently in the cache", 0),
+        }
+        # Hot data plus every index is what has to fit in the cache
+        sizes[name]["working_set_bytes"] = sizes[name]["data_bytes"] + sizes[name]["index_bytes"]
+    return sizes
+
+def print_sizes(before: dict, after: dict):
+    columns = ["count", "avg_doc_bytes", "data_bytes", "storage_bytes", "index_bytes", "indexes", "working_set_bytes", "cached_bytes"]
+    print(f"{'collection':<16}" + "".join(f"{column:>22}" for column in columns))
+    for name in COLLECTIONS:
+        cells = []
+        for column in columns:
+            old, new = before[name][column], after[name][column]
+            cells.append(f"{old:>10.0f} -> {new:<8.0f}")
+        print(f"{name:<16}" + "".join(f"{cell:>22}" for cell in cells))
+    for column in ("data_bytes", "index_bytes", "working_set_bytes"):
+        old = sum(sizes[column] for sizes in before.values())
+        new = sum(sizes[column] for sizes in after.values())
+        change = (new - old) / old * 100 if old else 0
+        print(f"total {column}: {old} -> {new} ({change:+.1f}%)")
+
+def migrate_collection(database, name: str, model, batch_size: int, dry_run: bool) -> Tuple[int, int]:
+    collection = database[name]
+    migrated = skipped = 0
+    last_id = None
+    while True:
+        # Page on _id so documents we cannot convert are not picked up again
+        legacy = {"_id": {"$type": "objectId"}}
+        if last_id is not None:
+            legacy["_id"]["$gt"] = last_id
+        batch = list(collection.find(legacy).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        ops = []
+        for doc in batch:
+            old_id = doc.pop("_id")
+            if doc.get(model.id_field) is None:
+                print(f"  {name} {old_id}: no {model.id_field}, leaving it as is")
+                skipped += 1
+                continue
+            try:
+                new_doc = model.encode(doc)
+            except HTTPException as e:
+                print(f"  {name} {old_id}: {e.detail}, leaving it as is")
+                skipped += 1
+                continue
+            # Upsert so a batch interrupted between the two writes can be replayed
+            ops.append(ReplaceOne({"_id": new_doc["_id"]}, new_doc, upsert=True))
+            ops.append(DeleteOne({"_id": old_id}))
+
+        if ops and not dry_run:
+            collection.bulk_write(ops, ordered=True)
+        migrated += len(ops) // 2
+        print(f"  {name}: {migrated} migrated, {skipped} skipped")
+    return migrated, skipped
+
+def backfill_maintenance_schedule(database, batch_size: int, dry_run: bool) -> Tuple[int, int]:
+    backfilled = skipped = 0
+    last_id = None
+    while True:
+        # Page on _id so health documents we cannot schedule are not picked up again
+        unscheduled = {"maintenance_due": {"$exists": False}}
+        if last_id is not None:
+            unscheduled["_id"] = {"$gt": last_id}
+        batch = list(database.car_health.find(unscheduled, {"_id": 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        # car_health shares its car's _id
+        cars = database.cars.find({"_id": {"$in": [health["_id"] for health in batch]}}, {"last_service_date": 1})
+        last_service = {car["_id"]: car.get("last_service_date") for car in cars}
+        ops = []
+        for health in batch:
+            if last_service.get(health["_id"]) is None:
+                print(f"  car_health {health['_id']}: no car or last_service_date, leaving it as is")
+                skipped += 1
+                continue
+            try:
+                due = maintenance_due_dates(last_service[health["_id"]])
+            except HTTPException as e:
+                print(f"  car_health {health['_id']}: {e.detail}, leaving it as is")
+                skipped += 1
+                continue
+            ops.append(UpdateOne(
+                {"_id": health["_id"], "maintenance_due": {"$exists": False}},
+                {"$set": maintenance_schedule(due)}
+            ))
+
+        if ops and not dry_run:
+            database.car_health.bulk_write(ops, ordered=False)
+        backfilled += len(ops)
+        print(f"  car_health: {backfilled} scheduled, {skipped} skipped")
+    return backfilled, skipped
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--compact", action="store_true", help="run compact afterwards to hand freed space back")
+    parser.add_argument("--dry-run", action="store_true", help="convert documents without writing them")
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGO_URL'), uuidRepresentation="standard")
+    database = client[os.environ.get('DB_NAME', 'veluxe_db')]
+
+    before = measure(database)
+    if not args.dry_run:
+        for name, index in OBSOLETE_INDEXES:
+            try:
+                database[name].drop_index(index)
+            except OperationFailure:
+                pass  # already gone
+
+    for name, model in COLLECTIONS.items():
+        print(f"Migrating {name}...")
+        migrate_collection(database, name, model, args.batch_size, args.dry_run)
+    print("Backfilling maintenance schedules...")
+    backfill_maintenance_schedule(database, args.batch_size, args.dry_run)
+
+    if not args.dry_run:
+        for name, keys, options in INDEXES:
+            database[name].create_index(keys, **options)
+        if args.compact:
+            for name in COLLECTIONS:
+                database.command("compact", name)
+
+    print_sizes(before, measure(database))
+
+if __name__ == "__main__":
+    main()
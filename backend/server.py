@@ -1,39 +1,589 @@
+import time
+BOOT_STARTED = time.perf_counter()
+
 import os
+import sys
+import math
+import json
+import gzip
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends
+import hashlib
+import importlib
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import ClassVar, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
+from starlette.routing import Match
 import motor.motor_asyncio
+from pymongo import ASCENDING, DeleteOne, InsertOne, ReturnDocument, UpdateOne, read_preferences
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import uuid
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
+
+# Startup profiling
+class StartupProfiler:
+    # Packages from requirements.txt that must never end up imported by the API process
+    heavy_modules = ("kubernetes", "boto3", "botocore", "litellm", "google.cloud.pubsub", "supabase")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    def record(self, name: str, since: float):
+        self.phases[name] = round((time.perf_counter() - since) * 1000, 2)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def mark_ready(self):
+        self.ready_at = time.perf_counter()
+
+    def report(self) -> dict:
+        ready_at = self.ready_at or time.perf_counter()
+        return {
+            "ready": self.ready_at is not None,
+            "total_ms": round((ready_at - self.started) * 1000, 2),
+            "phases_ms": self.phases,
+            "heavy_modules_loaded": [name for name in self.heavy_modules if name in sys.modules],
+        }
+
+startup_profiler = StartupProfiler(BOOT_STARTED)
+startup_profiler.record("import:core", BOOT_STARTED)
+
+def optional_import(name: str):
+    # Import an optional integration on first use, returning None when it is not installed
+    if name in sys.modules:
+        return sys.modules[name]
+    with startup_profiler.phase(f"import:{name}"):
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            return None
 
 # MongoDB client setup
-client = motor.motor_asyncio.AsyncIOMotorClient(os.environ.get('MONGO_URL'))
-db = client[os.environ.get('DB_NAME', 'veluxe_db')]
+with startup_profiler.phase("mongo_client"):
+    # Standard UUID representation stores uuid.UUID values as BSON binary subtype 4
+    client = motor.motor_asyncio.AsyncIOMotorClient(os.environ.get('MONGO_URL'), uuidRepresentation="standard")
+    db = client[os.environ.get('DB_NAME', 'veluxe_db')]
+
+# Query auditing (test mode): records every filter and sort so they can be explained later
+def query_shape(value):
+    # Same query with different ids or dates has the same shape
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(item) for item in value[:1]]
+    return type(value).__name__
+
+class QueryAuditor:
+    def __init__(self):
+        self.queries: Dict[str, dict] = {}
+
+    def record(self, collection: str, operation: str, filter: Optional[dict], sort=None) -> dict:
+        query = {"collection": collection, "operation": operation, "filter": filter or {}, "sort": sort}
+        key = repr((collection, query_shape(query["filter"]), sort and [field for field, _ in sort]))
+        return self.queries.setdefault(key, query)
+
+    async def explain(self, database, max_examined_ratio: float = 10) -> List[dict]:
+        reports = []
+        for query in self.queries.values():
+            command = {"find": query["collection"], "filter": query["filter"]}
+            if query["sort"]:
+                command["sort"] = dict(query["sort"])
+            explained = await database.command({"explain": command, "verbosity": "executionStats"})
+            stats = explained["executionStats"]
+            stages = plan_stages(explained["queryPlanner"]["winningPlan"])
+            examined = stats["totalDocsExamined"]
+            returned = stats["nReturned"]
+            problems = []
+            # An empty filter is a deliberate full listing, e.g. the events catalog
+            if "COLLSCAN" in stages and query["filter"]:
+                problems.append("COLLSCAN")
+            if examined > max_examined_ratio * max(returned, 1):
+                problems.append(f"examined {examined} docs to return {returned}")
+            reports.append({
+                **query,
+                "filter": repr(query["filter"]),
+                "stages": stages,
+                "docs_examined": examined,
+                "keys_examined": stats["totalKeysExamined"],
+                "returned": returned,
+                "problems": problems
+            })
+        return reports
+
+def plan_stages(plan: dict) -> List[str]:
+    stages = [plan["stage"]]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+class AuditedCursor:
+    # Records its query when it is first read rather than when find() is called,
+    # so a sort() applied in between becomes part of it
+    def __init__(self, cursor, auditor: QueryAuditor, collection: str, filter: Optional[dict], sort=None):
+        self.cursor = cursor
+        self.auditor = auditor
+        self.collection = collection
+        self.filter = filter
+        self.sort_fields = sort
+        self.recorded = False
+
+    def record(self):
+        if not self.recorded:
+            self.auditor.record(self.collection, "find", self.filter, self.sort_fields)
+            self.recorded = True
+
+    def sort(self, key_or_list, direction=None):
+        sort = [(key_or_list, direction or ASCENDING)] if isinstance(key_or_list, str) else list(key_or_list)
+        self.sort_fields = (self.sort_fields or []) + sort
+        self.cursor = self.cursor.sort(key_or_list, direction) if direction else self.cursor.sort(key_or_list)
+        return self
+
+    def __getattr__(self, name):
+        attribute = getattr(self.cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # limit(), skip() and friends return the cursor, so keep wrapping it;
+            # anything else, such as to_list(), reads it
+            if result is self.cursor:
+                return self
+            self.record()
+            return result
+        return chained
+
+    def __aiter__(self):
+        self.record()
+        return self.cursor.__aiter__()
+
+class AuditedCollection:
+    filtered_operations = (
+        "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete", "update_one",
+        "update_many", "replace_one", "delete_one", "delete_many", "count_documents"
+    )
+
+    def __init__(self, collection, auditor: QueryAuditor):
+        self.collection = collection
+        self.auditor = auditor
+
+    def find(self, filter=None, *args, **kwargs):
+        cursor = self.collection.find(filter, *args, **kwargs)
+        return AuditedCursor(cursor, self.auditor, self.collection.name, filter, kwargs.get("sort"))
+
+    def bulk_write(self, requests, *args, **kwargs):
+        requests = list(requests)
+        for request in requests:
+            # UpdateOne, ReplaceOne, DeleteOne and co. carry a filter; InsertOne does not
+            filter = getattr(request, "_filter", None)
+            if filter is not None:
+                self.auditor.record(self.collection.name, f"bulk_write:{type(request).__name__}", filter)
+        return self.collection.bulk_write(requests, *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        # A leading $match (and the $sort right after it) is what can use an index
+        if pipeline and "$match" in pipeline[0]:
+            sort = None
+            if len(pipeline) > 1 and "$sort" in pipeline[1]:
+                sort = list(pipeline[1]["$sort"].items())
+            self.auditor.record(self.collection.name, "aggregate", pipeline[0]["$match"], sort)
+        return self.collection.aggregate(pipeline, *args, **kwargs)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.collection, name)
+        if name not in self.filtered_operations:
+            return attribute
+
+        def audited(filter, *args, **kwargs):
+            self.auditor.record(self.collection.name, name, filter, kwargs.get("sort"))
+            return attribute(filter, *args, **kwargs)
+        return audited
+
+class AuditedDatabase:
+    def __init__(self, database, auditor: QueryAuditor):
+        self.database = database
+        self.auditor = auditor
+
+    def __getitem__(self, name):
+        return AuditedCollection(self.database[name], self.auditor)
+
+    def __getattr__(self, name):
+        # Database methods such as command pass through, anything else is a collection
+        if hasattr(type(self.database), name):
+            return getattr(self.database, name)
+        return self[name]
+
+# Read routing
+READ_PREFERENCES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
+def read_preference_from_env():
+    # e.g. MONGO_READ_PREFERENCE=secondaryPreferred MONGO_MAX_STALENESS_SECONDS=90 (90 is the minimum)
+    mode = READ_PREFERENCES[os.environ.get('MONGO_READ_PREFERENCE', 'primary')]
+    if mode is read_preferences.Primary:
+        return mode()
+    return mode(max_staleness=int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1')))
+
+class ReadRouter:
+    # Tolerant reads go through read_db, which may hit a secondary. After a user writes,
+    # their reads run in a causally consistent session that starts at their last write,
+    # so a lagging secondary waits until it has caught up instead of returning stale data.
+    # To try it locally: mongod --replSet rs0, then rs.initiate() in mongosh.
+    max_tokens = 100_000
+
+    def __init__(self, read_your_writes_seconds: float):
+        self.read_your_writes_seconds = read_your_writes_seconds
+        # user_id -> (cluster time, operation time, expiry) of their last write
+        self.write_tokens: Dict[str, tuple] = {}
+
+    @asynccontextmanager
+    async def write_session(self, user_id: Optional[str] = None):
+        async with await client.start_session(causal_consistency=True) as session:
+            yield session
+            if user_id and session.operation_time is not None:
+                self.record_write(user_id, session)
+
+    def record_write(self, user_id: str, session):
+        if len(self.write_tokens) >= self.max_tokens:
+            now = time.monotonic()
+            self.write_tokens = {user: token for user, token in self.write_tokens.items() if token[2] > now}
+        expires = time.monotonic() + self.read_your_writes_seconds
+        self.write_tokens[user_id] = (session.cluster_time, session.operation_time, expires)
+
+    @asynccontextmanager
+    async def read_session(self, user_id: Optional[str] = None):
+        token = self.write_tokens.get(user_id) if user_id else None
+        if token is None or token[2] < time.monotonic():
+            yield None
+            return
+        async with await client.start_session(causal_consistency=True) as session:
+            session.advance_cluster_time(token[0])
+            session.advance_operation_time(token[1])
+            yield session
+
+read_db = client.get_database(os.environ.get('DB_NAME', 'veluxe_db'), read_preference=read_preference_from_env())
+read_router = ReadRouter(float(os.environ.get('MONGO_READ_YOUR_WRITES_SECONDS', '300')))
+
+query_auditor = None
+if os.environ.get('QUERY_AUDIT'):
+    query_auditor = QueryAuditor()
+    db = AuditedDatabase(db, query_auditor)
+    read_db = AuditedDatabase(read_db, query_auditor)
+
+# Document ids live in _id, which is always indexed
+INDEXES = [
+    ("cars", [("user_id", ASCENDING)], {}),
+    ("bookings", [("user_id", ASCENDING)], {}),
+    ("events", [("title", ASCENDING)], {}),
+    ("event_rsvps", [("event_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True}),
+    ("event_waitlist", [("event_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True}),
+    ("event_waitlist", [("event_id", ASCENDING), ("seq", ASCENDING)], {}),
+    ("car_health", [("next_due_at", ASCENDING)], {"sparse": True}),
+    ("maintenance_alerts", [("car_id", ASCENDING), ("alert_type", ASCENDING), ("due_at", ASCENDING)], {"unique": True}),
+    ("idempotency_keys", [("created_at", ASCENDING)], {
+        "expireAfterSeconds": int(os.environ.get('IDEMPOTENCY_KEY_TTL_SECONDS', '86400'))
+    }),
+]
+
+# Unique indexes on the old string ids would reject every document that no longer has one
+OBSOLETE_INDEXES = [
+    ("users", "id_1"),
+    ("cars", "id_1"),
+    ("car_health", "car_id_1"),
+    ("bookings", "id_1"),
+    ("events", "id_1"),
+]
+
+async def ensure_indexes():
+    for collection, name in OBSOLETE_INDEXES:
+        try:
+            await db[collection].drop_index(name)
+        except OperationFailure:
+            pass  # already gone
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            # Existing duplicates block a unique index; the app still works without it
+            print(f"Failed to create index {collection}.{keys}: {e}")
+
+async def run_transaction(callback, user_id: Optional[str] = None):
+    # Standalone mongod has no transactions (IllegalOperation, code 20), so fall back to plain writes
+    async with read_router.write_session(user_id) as session:
+        try:
+            async with session.start_transaction():
+                return await callback(session)
+        except OperationFailure as e:
+            if e.code != 20:
+                raise
+    return await callback(None)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting Veluxe backend...")
+    with startup_profiler.phase("lifespan:ensure_indexes"):
+        await ensure_indexes()
+    with startup_profiler.phase("lifespan:seed_sample_events"):
+        await seed_sample_events()
+    with startup_profiler.phase("lifespan:bootstrap_snapshot"):
+        await bootstrap_snapshot.load()
+    startup_profiler.mark_ready()
+    if os.environ.get('STARTUP_PROFILE'):
+        print(f"Startup profile: {startup_profiler.report()}")
+    # Set MAINTENANCE_SCHEDULER=0 when alerts run in a separate `server.py --maintenance-worker`
+    scheduler_task = None
+    if os.environ.get('MAINTENANCE_SCHEDULER', '1') != '0':
+        scheduler_task = asyncio.create_task(maintenance_scheduler.run_forever())
     yield
     # Shutdown
     print("Shutting down Veluxe backend...")
+    if scheduler_task:
+        scheduler_task.cancel()
 
 app = FastAPI(lifespan=lifespan)
 
-# CORS configuration
+# Rate limiting (token bucket per client and route)
+class RateLimitRule(BaseModel):
+    capacity: int  # burst size
+    refill_per_second: float  # sustained rate
+
+# Keyed by (method, route path template) so every car/event shares one rule. Requests are
+# counted per client IP: there is no authenticated user yet, and a user_id in the path,
+# query or body is whatever the client chose to send.
+RATE_LIMITS: Dict[Tuple[str, str], RateLimitRule] = {
+    ("POST", "/api/ai-predictions/{car_id}"): RateLimitRule(capacity=5, refill_per_second=5 / 60),
+    ("POST", "/api/bookings"): RateLimitRule(capacity=10, refill_per_second=10 / 60),
+    ("POST", "/api/cars"): RateLimitRule(capacity=10, refill_per_second=10 / 60),
+    ("POST", "/api/events/{event_id}/rsvp"): RateLimitRule(capacity=20, refill_per_second=20 / 60),
+    ("GET", "/api/debug/init-events"): RateLimitRule(capacity=2, refill_per_second=1 / 60),
+}
+
+class InMemoryTokenBucketStore:
+    # Buckets live in this process only; fine for a single uvicorn worker
+    max_buckets = 100_000
+
+    def __init__(self):
+        # key -> [tokens, last refill time, time the bucket will be full again]
+        self.buckets: Dict[str, List[float]] = {}
+
+    async def consume(self, key: str, rule: RateLimitRule, cost: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                self._evict_full_buckets(now)
+            bucket = self.buckets[key] = [float(rule.capacity), now, now]
+
+        tokens = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.refill_per_second)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        bucket[0] = tokens
+        bucket[1] = now
+        bucket[2] = now + (rule.capacity - tokens) / rule.refill_per_second
+        if allowed:
+            return True, 0.0
+        return False, (cost - tokens) / rule.refill_per_second
+
+    def _evict_full_buckets(self, now: float):
+        # A bucket that has refilled completely is the same as a missing one
+        for key, bucket in list(self.buckets.items()):
+            if bucket[2] <= now:
+                del self.buckets[key]
+
+class RedisTokenBucketStore:
+    # Refill and take happen in one Lua script so concurrent workers cannot race
+    LUA_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+    def __init__(self, aioredis, url: str):
+        self.redis = aioredis.from_url(url)
+        self.script = self.redis.register_script(self.LUA_TOKEN_BUCKET)
+
+    async def consume(self, key: str, rule: RateLimitRule, cost: float = 1) -> Tuple[bool, float]:
+        allowed, retry_after = await self.script(
+            keys=[f"ratelimit:{key}"],
+            args=[rule.capacity, rule.refill_per_second, cost],
+        )
+        return bool(int(allowed)), float(retry_after)
+
+def create_rate_limit_store():
+    redis_url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    if not redis_url:
+        return InMemoryTokenBucketStore()
+    aioredis = optional_import("redis.asyncio")
+    if aioredis is not None:
+        return RedisTokenBucketStore(aioredis, redis_url)
+    print("RATE_LIMIT_REDIS_URL is set but redis is not installed, using in-memory rate limits")
+    return InMemoryTokenBucketStore()
+
+rate_limit_store = create_rate_limit_store()
+
+def match_route(scope) -> Optional[str]:
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+    return None
+
+# Only these peers may tell us the client address; anyone else could forge X-Forwarded-For
+TRUSTED_PROXIES = {
+    address.strip() for address in os.environ.get('TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if address.strip()
+}
+
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if forwarded_for and peer in TRUSTED_PROXIES:
+        # nginx appends the address it saw, so the right-most hop is the one we can trust
+        return forwarded_for.split(",")[-1].strip()
+    return peer
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    route_path = match_route(request.scope)
+    rule = RATE_LIMITS.get((request.method, route_path)) if route_path else None
+    if rule is None:
+        return await call_next(request)
+
+    key = f"{request.method}:{route_path}:ip:{client_ip(request)}"
+    try:
+        allowed, retry_after = await rate_limit_store.consume(key, rule)
+    except Exception as e:
+        # Fail open: a limiter outage should not take the API down with it
+        print(f"Rate limit store error: {e}")
+        return await call_next(request)
+
+    if not allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+    return await call_next(request)
+
+# CORS configuration. Registered after the rate limiter so it wraps it and 429s carry CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+# Storage codec
+def as_uuid(value):
+    # Anything that is not a UUID string is left alone, so it simply matches nothing
+    try:
+        return uuid.UUID(value)
+    except (TypeError, ValueError, AttributeError):
+        return value
+
+def as_datetime(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Invalid date: {value}")
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class MongoModel(BaseModel):
+    # Documents are stored with their id as a binary UUID _id, references as binary
+    # UUIDs and dates as native datetimes. The API keeps exchanging plain strings.
+    id_field: ClassVar[str] = "id"
+    uuid_fields: ClassVar[Tuple[str, ...]] = ()
+    date_fields: ClassVar[Tuple[str, ...]] = ()  # returned as YYYY-MM-DD
+    datetime_fields: ClassVar[Tuple[str, ...]] = ()  # returned as ISO timestamps
+    internal_fields: ClassVar[Tuple[str, ...]] = ()  # stored for the backend, never returned
+
+    def to_mongo(self) -> dict:
+        return self.encode(self.dict())
+
+    @classmethod
+    def encode(cls, doc: dict) -> dict:
+        doc = dict(doc)
+        document_id = doc.pop(cls.id_field, None)
+        if document_id is not None:
+            doc["_id"] = as_uuid(document_id)
+        for field in cls.uuid_fields:
+            if doc.get(field) is not None:
+                doc[field] = as_uuid(doc[field])
+        for field in cls.date_fields + cls.datetime_fields:
+            if doc.get(field) is not None:
+                doc[field] = as_datetime(doc[field])
+        return doc
+
+    @classmethod
+    def from_mongo(cls, doc: dict) -> dict:
+        doc = dict(doc)
+        # Documents written before the migration still carry an ObjectId _id and a string id
+        document_id = doc.pop("_id", None)
+        if isinstance(document_id, uuid.UUID):
+            doc = {cls.id_field: str(document_id), **doc}
+        for field in cls.internal_fields:
+            doc.pop(field, None)
+        for field in cls.uuid_fields:
+            if isinstance(doc.get(field), uuid.UUID):
+                doc[field] = str(doc[field])
+        for field in cls.date_fields:
+            if isinstance(doc.get(field), datetime):
+                doc[field] = doc[field].strftime("%Y-%m-%d")
+        for field in cls.datetime_fields:
+            if isinstance(doc.get(field), datetime):
+                doc[field] = doc[field].isoformat()
+        return doc
+
 # Pydantic models
-class Car(BaseModel):
+class Car(MongoModel):
+    uuid_fields: ClassVar[Tuple[str, ...]] = ("user_id",)
+    date_fields: ClassVar[Tuple[str, ...]] = ("last_service_date",)
+
     id: str = None
     user_id: str
     brand: str
@@ -44,7 +594,13 @@ class Car(BaseModel):
     vin: str
     color: str
     
-class CarHealth(BaseModel):
+class CarHealth(MongoModel):
+    # One health document per car, so it shares the car's id
+    id_field: ClassVar[str] = "car_id"
+    datetime_fields: ClassVar[Tuple[str, ...]] = ("last_updated",)
+    # Maintenance scheduler state, see maintenance_schedule()
+    internal_fields: ClassVar[Tuple[str, ...]] = ("maintenance_due", "next_due_at")
+
     car_id: str
     oil_status: int  # 0-100
     brake_status: int  # 0-100
@@ -53,7 +609,10 @@ class CarHealth(BaseModel):
     last_updated: str
     ai_predictions: dict = {}
 
-class ServiceBooking(BaseModel):
+class ServiceBooking(MongoModel):
+    uuid_fields: ClassVar[Tuple[str, ...]] = ("user_id", "car_id")
+    date_fields: ClassVar[Tuple[str, ...]] = ("appointment_date",)
+
     id: str = None
     user_id: str
     car_id: str
@@ -64,7 +623,9 @@ class ServiceBooking(BaseModel):
     status: str = "scheduled"
     special_instructions: str = ""
 
-class User(BaseModel):
+class User(MongoModel):
+    datetime_fields: ClassVar[Tuple[str, ...]] = ("created_at",)
+
     id: str = None
     name: str
     email: str
@@ -72,7 +633,23 @@ class User(BaseModel):
     membership_tier: str = "Basic"  # Basic, Premium, Veluxe Elite
     created_at: str
 
-class Event(BaseModel):
+class MaintenanceAlert(MongoModel):
+    uuid_fields: ClassVar[Tuple[str, ...]] = ("car_id",)
+    datetime_fields: ClassVar[Tuple[str, ...]] = ("due_at", "created_at")
+
+    id: str = None
+    car_id: str
+    alert_type: str  # a MAINTENANCE_INTERVALS key, e.g. "oil_change_due"
+    due_at: str
+    created_at: str
+
+class BulkRSVPRequest(BaseModel):
+    user_ids: List[str] = []  # RSVP these users, waitlisting whoever does not fit
+    promote: int = 0  # promote up to this many users from the front of the waitlist
+
+class Event(MongoModel):
+    date_fields: ClassVar[Tuple[str, ...]] = ("date",)
+
     id: str = None
     title: str
     description: str
@@ -83,6 +660,263 @@ class Event(BaseModel):
     current_attendees: int = 0
     brands_filter: List[str] = []
 
+class EventRSVP(MongoModel):
+    uuid_fields: ClassVar[Tuple[str, ...]] = ("event_id", "user_id")
+    datetime_fields: ClassVar[Tuple[str, ...]] = ("created_at",)
+
+    id: str = None
+    event_id: str
+    user_id: str
+    created_at: str
+
+class WaitlistEntry(EventRSVP):
+    seq: int
+
+# Request-scoped loaders
+class DataLoader:
+    # Collects keys requested in the same event-loop tick and resolves them with one batch call
+    def __init__(self, batch_fn):
+        self.batch_fn = batch_fn
+        self.cache: Dict[str, asyncio.Future] = {}
+        self.pending: List[str] = []
+        # asyncio only keeps weak references to tasks, so hold on to the running dispatch
+        self.dispatch_task: Optional[asyncio.Task] = None
+
+    def load(self, key: str) -> asyncio.Future:
+        future = self.cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.cache[key] = loop.create_future()
+            self.pending.append(key)
+            if len(self.pending) == 1:
+                loop.call_soon(self.start_dispatch)
+        return future
+
+    def start_dispatch(self):
+        self.dispatch_task = asyncio.get_running_loop().create_task(self.dispatch())
+
+    async def load_many(self, keys: List[str]) -> list:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    async def dispatch(self):
+        keys, self.pending = self.pending, []
+        try:
+            results = await self.batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                future = self.cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key in keys:
+            future = self.cache[key]
+            if not future.done():
+                future.set_result(results.get(key))
+
+async def load_car_health_batch(car_ids: List[str], session=None) -> dict:
+    health_by_car = {}
+    query = {"_id": {"$in": [as_uuid(car_id) for car_id in car_ids]}}
+    async for health in read_db.car_health.find(query, session=session):
+        health = CarHealth.from_mongo(health)
+        health_by_car[health["car_id"]] = health
+    return health_by_car
+
+async def load_cars_by_user_batch(user_ids: List[str], session=None) -> dict:
+    cars_by_user = {user_id: [] for user_id in user_ids}
+    query = {"user_id": {"$in": [as_uuid(user_id) for user_id in user_ids]}}
+    async for car in read_db.cars.find(query, session=session):
+        car = Car.from_mongo(car)
+        cars_by_user.setdefault(car["user_id"], []).append(car)
+    return cars_by_user
+
+class Loaders:
+    def __init__(self, session=None):
+        self.car_health = DataLoader(lambda car_ids: load_car_health_batch(car_ids, session))
+        self.cars_by_user = DataLoader(lambda user_ids: load_cars_by_user_batch(user_ids, session))
+
+async def get_loaders(user_id: Optional[str] = None):
+    # FastAPI caches dependencies per request, so handlers in one request share these.
+    # user_id comes from the route path or query string and keeps that user's writes visible.
+    async with read_router.read_session(user_id) as session:
+        yield Loaders(session)
+
+# Idempotency keys
+# How long a request may hold its key in progress before a retry may take it over.
+# Keep it well above the slowest handler so a live request is never run twice.
+IDEMPOTENCY_LEASE = timedelta(seconds=int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '60')))
+
+async def run_idempotent(scope: str, key: Optional[str], payload: BaseModel, handler):
+    # The first request with an Idempotency-Key runs the handler and stores its response;
+    # retries with the same key get that response back without writing anything again.
+    if not key:
+        return await handler()
+
+    record_id = f"{scope}:{getattr(payload, 'user_id', '')}:{key}"
+    request_hash = hashlib.sha256(json.dumps(payload.dict(), sort_keys=True).encode()).hexdigest()
+    owner = str(uuid.uuid4())
+    # Aware UTC, which is what the TTL index on created_at assumes
+    now = datetime.now(timezone.utc)
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": record_id,
+            "request_hash": request_hash,
+            "status": "in_progress",
+            "owner": owner,
+            "locked_until": now + IDEMPOTENCY_LEASE,
+            "created_at": now
+        })
+    except DuplicateKeyError:
+        # A process that died mid-request leaves its key in progress; once the lease
+        # has run out the retry takes the key over and runs the handler itself
+        record = await db.idempotency_keys.find_one_and_update(
+            {"_id": record_id, "request_hash": request_hash, "status": "in_progress", "locked_until": {"$lt": now}},
+            {"$set": {"owner": owner, "locked_until": now + IDEMPOTENCY_LEASE}}
+        )
+        if record is None:
+            record = await db.idempotency_keys.find_one({"_id": record_id})
+            if record is not None and record["request_hash"] != request_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            if record is None or record["status"] != "completed":
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"}
+                )
+            return JSONResponse(record["response"], headers={"Idempotent-Replayed": "true"})
+
+    # Both writes check owner so a request whose lease was taken over leaves the key alone
+    try:
+        response = await handler()
+    except Exception:
+        # Let the client retry a request that did not go through
+        await db.idempotency_keys.delete_one({"_id": record_id, "owner": owner})
+        raise
+    await db.idempotency_keys.update_one(
+        {"_id": record_id, "owner": owner},
+        {"$set": {"status": "completed", "response": response}}
+    )
+    return response
+
+# Membership-tier admission control
+TIER_PRIORITY = ["Veluxe Elite", "Premium", "Basic"]  # queues are served in this order
+
+# Share of the total concurrency each tier may hold, so Elite always has free slots left
+TIER_CONCURRENCY_SHARE = {"Veluxe Elite": 1.0, "Premium": 0.75, "Basic": 0.5}
+
+class AdmissionController:
+    # Bounds how many expensive handlers run at once. When full, requests wait in one
+    # FIFO queue per tier and freed slots go to the highest-priority tier that has room.
+    def __init__(self, max_concurrency: int, queue_timeout_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.tier_limits = {
+            tier: max(1, int(max_concurrency * share)) for tier, share in TIER_CONCURRENCY_SHARE.items()
+        }
+        self.in_flight = 0
+        self.tier_in_flight = {tier: 0 for tier in TIER_PRIORITY}
+        self.queues = {tier: deque() for tier in TIER_PRIORITY}
+        self.metrics = {
+            tier: {"admitted": 0, "rejected": 0, "queue_ms": deque(maxlen=1000)} for tier in TIER_PRIORITY
+        }
+
+    def can_admit(self, tier: str) -> bool:
+        return self.in_flight < self.max_concurrency and self.tier_in_flight[tier] < self.tier_limits[tier]
+
+    def admit(self, tier: str, queued_at: float):
+        self.in_flight += 1
+        self.tier_in_flight[tier] += 1
+        self.metrics[tier]["admitted"] += 1
+        self.metrics[tier]["queue_ms"].append((time.perf_counter() - queued_at) * 1000)
+
+    def release(self, tier: str):
+        self.in_flight -= 1
+        self.tier_in_flight[tier] -= 1
+        for next_tier in TIER_PRIORITY:
+            queue = self.queues[next_tier]
+            while queue and self.can_admit(next_tier):
+                waiter, queued_at = queue.popleft()
+                if waiter.done():
+                    continue  # timed out or the client went away
+                self.admit(next_tier, queued_at)
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, tier: str):
+        tier = tier if tier in self.queues else "Basic"
+        queued_at = time.perf_counter()
+        if self.can_admit(tier) and not self.queues[tier]:
+            self.admit(tier, queued_at)
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.queues[tier].append((waiter, queued_at))
+            try:
+                await asyncio.wait_for(waiter, self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                self.metrics[tier]["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Service is busy, please retry",
+                    headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout_seconds)))}
+                )
+            except asyncio.CancelledError:
+                # Admitted just as the request was cancelled: hand the slot back
+                if waiter.done() and not waiter.cancelled():
+                    self.release(tier)
+                raise
+        try:
+            yield
+        finally:
+            self.release(tier)
+
+    def report(self) -> dict:
+        tiers = {}
+        for tier in TIER_PRIORITY:
+            samples = sorted(self.metrics[tier]["queue_ms"])
+            tiers[tier] = {
+                "limit": self.tier_limits[tier],
+                "in_flight": self.tier_in_flight[tier],
+                "queued": sum(1 for waiter, _ in self.queues[tier] if not waiter.done()),
+                "admitted": self.metrics[tier]["admitted"],
+                "rejected": self.metrics[tier]["rejected"],
+                "queue_ms_p50": round(samples[len(samples) // 2], 2) if samples else 0,
+                "queue_ms_p95": round(samples[int(len(samples) * 0.95)], 2) if samples else 0,
+                "queue_ms_max": round(samples[-1], 2) if samples else 0,
+            }
+        return {"max_concurrency": self.max_concurrency, "in_flight": self.in_flight, "tiers": tiers}
+
+admission = AdmissionController(
+    max_concurrency=int(os.environ.get('ADMISSION_MAX_CONCURRENCY', '16')),
+    queue_timeout_seconds=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', '10'))
+)
+
+# Tiers change rarely and car owners never, so both are cached to keep lookups off the hot path
+TIER_CACHE_SECONDS = 300
+tier_cache: Dict[str, Tuple[str, float]] = {}
+car_owner_cache: Dict[str, Optional[str]] = {}
+
+async def membership_tier(user_id: Optional[str]) -> str:
+    if not user_id:
+        return "Basic"
+    cached = tier_cache.get(user_id)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    user = await read_db.users.find_one({"_id": as_uuid(user_id)}, {"membership_tier": 1})
+    tier = (user or {}).get("membership_tier", "Basic")
+    if len(tier_cache) >= 100_000:
+        tier_cache.clear()
+    tier_cache[user_id] = (tier, time.monotonic() + TIER_CACHE_SECONDS)
+    return tier
+
+async def car_owner(car_id: str) -> Optional[str]:
+    if car_id not in car_owner_cache:
+        car = await read_db.cars.find_one({"_id": as_uuid(car_id)}, {"user_id": 1})
+        if not car:
+            return None
+        if len(car_owner_cache) >= 100_000:
+            car_owner_cache.clear()
+        car_owner_cache[car_id] = Car.from_mongo(car)["user_id"]
+    return car_owner_cache[car_id]
+
 # API Routes
 @app.get("/api/health")
 async def health_check():
@@ -93,114 +927,484 @@ async def create_user(user: User):
     user.id = str(uuid.uuid4())
     user.created_at = datetime.now().isoformat()
     
-    result = await db.users.insert_one(user.dict())
+    async with read_router.write_session(user.id) as session:
+        result = await db.users.insert_one(user.to_mongo(), session=session)
     if result.inserted_id:
         return {"success": True, "user_id": user.id}
     raise HTTPException(status_code=500, detail="Failed to create user")
 
 @app.get("/api/users/{user_id}")
 async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id})
+    async with read_router.read_session(user_id) as session:
+        user = await read_db.users.find_one({"_id": as_uuid(user_id)}, session=session)
     if user:
-        user.pop('_id', None)
-        return user
+        return User.from_mongo(user)
     raise HTTPException(status_code=404, detail="User not found")
 
 @app.post("/api/cars")
-async def add_car(car: Car):
-    car.id = str(uuid.uuid4())
-    
-    result = await db.cars.insert_one(car.dict())
-    if result.inserted_id:
-        # Initialize car health data
-        health = CarHealth(
-            car_id=car.id,
-            oil_status=85,
-            brake_status=92,
-            battery_status=88,
-            tire_status=76,
-            last_updated=datetime.now().isoformat(),
-            ai_predictions={
-                "oil_change_due": "2024-08-15",
-                "brake_inspection": "2024-09-01",
-                "tire_rotation": "2024-07-20",
-                "battery_check": "2024-12-01"
-            }
-        )
-        await db.car_health.insert_one(health.dict())
+async def add_car(car: Car, idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        car.id = str(uuid.uuid4())
         
+        due = maintenance_due_dates(car.last_service_date)
+        async with read_router.write_session(car.user_id) as session:
+            result = await db.cars.insert_one(car.to_mongo(), session=session)
+            if not result.inserted_id:
+                raise HTTPException(status_code=500, detail="Failed to add car")
+
+            # Initialize car health data
+            health = CarHealth(
+                car_id=car.id,
+                oil_status=85,
+                brake_status=92,
+                battery_status=88,
+                tire_status=76,
+                last_updated=datetime.now().isoformat(),
+                ai_predictions={alert_type: due_at.strftime("%Y-%m-%d") for alert_type, due_at in due.items()}
+            )
+            # The scheduler reads maintenance_due, ai_predictions is replaced by the AI endpoint
+            await db.car_health.insert_one({**health.to_mongo(), **maintenance_schedule(due)}, session=session)
+            
         return {"success": True, "car_id": car.id}
-    raise HTTPException(status_code=500, detail="Failed to add car")
+
+    return await run_idempotent("cars", idempotency_key, car, create)
 
 @app.get("/api/cars/user/{user_id}")
-async def get_user_cars(user_id: str):
-    cars = []
-    async for car in db.cars.find({"user_id": user_id}):
-        car.pop('_id', None)
-        cars.append(car)
+async def get_user_cars(user_id: str, include_health: bool = False, loaders: Loaders = Depends(get_loaders)):
+    cars = await loaders.cars_by_user.load(user_id)
+    if include_health:
+        # One $in query for every car instead of a find_one per car
+        healths = await loaders.car_health.load_many([car["id"] for car in cars])
+        for car, health in zip(cars, healths):
+            car["health"] = health
     return cars
 
 @app.get("/api/car-health/{car_id}")
-async def get_car_health(car_id: str):
-    health = await db.car_health.find_one({"car_id": car_id})
+async def get_car_health(car_id: str, user_id: Optional[str] = None, loaders: Loaders = Depends(get_loaders)):
+    health = await loaders.car_health.load(car_id)
     if health:
-        health.pop('_id', None)
         return health
     raise HTTPException(status_code=404, detail="Car health data not found")
 
 @app.post("/api/bookings")
-async def create_booking(booking: ServiceBooking):
-    booking.id = str(uuid.uuid4())
-    
-    result = await db.bookings.insert_one(booking.dict())
-    if result.inserted_id:
-        return {"success": True, "booking_id": booking.id}
-    raise HTTPException(status_code=500, detail="Failed to create booking")
+async def create_booking(booking: ServiceBooking, idempotency_key: Optional[str] = Header(None)):
+    async def create():
+        booking.id = str(uuid.uuid4())
+        
+        # Only a booking that really gets written takes a slot; replays skip admission
+        async with admission.slot(await membership_tier(booking.user_id)):
+            async with read_router.write_session(booking.user_id) as session:
+                result = await db.bookings.insert_one(booking.to_mongo(), session=session)
+        if result.inserted_id:
+            return {"success": True, "booking_id": booking.id}
+        raise HTTPException(status_code=500, detail="Failed to create booking")
+
+    return await run_idempotent("bookings", idempotency_key, booking, create)
 
 @app.get("/api/bookings/user/{user_id}")
 async def get_user_bookings(user_id: str):
     bookings = []
-    async for booking in db.bookings.find({"user_id": user_id}):
-        booking.pop('_id', None)
-        bookings.append(booking)
+    async with read_router.read_session(user_id) as session:
+        async for booking in read_db.bookings.find({"user_id": as_uuid(user_id)}, session=session):
+            bookings.append(ServiceBooking.from_mongo(booking))
     return bookings
 
+@app.post("/api/bookings/{booking_id}/complete")
+async def complete_booking(booking_id: str):
+    async with read_router.write_session() as session:
+        booking = await db.bookings.find_one_and_update(
+            {"_id": as_uuid(booking_id), "status": {"$ne": "completed"}},
+            {"$set": {"status": "completed"}},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if not booking:
+            raise HTTPException(status_code=404, detail="Booking not found or already completed")
+        # The car was serviced on the appointment date, so its maintenance starts over from there
+        await record_service(booking["car_id"], booking["appointment_date"], session=session)
+        # The owner is only known now, so record the write for their reads by hand
+        if session.operation_time is not None:
+            read_router.record_write(str(booking["user_id"]), session)
+    return {"success": True, "booking": ServiceBooking.from_mongo(booking)}
+
 @app.get("/api/events")
-async def get_events():
+async def get_events(user_id: Optional[str] = None):
+    # Pass user_id to see attendee counts that include your own RSVP
     events = []
-    async for event in db.events.find():
-        event.pop('_id', None)
-        events.append(event)
+    async with read_router.read_session(user_id) as session:
+        async for event in read_db.events.find(session=session):
+            events.append(Event.from_mongo(event))
     return events
 
+# App bootstrap snapshot
+SERVICE_TYPES = [
+    {"id": "maintenance", "name": "General Maintenance"},
+    {"id": "detailing", "name": "Premium Detailing"},
+    {"id": "tire-change", "name": "Tire Change/Rotation"},
+    {"id": "oil-change", "name": "Oil Change"},
+    {"id": "brake-service", "name": "Brake Service"},
+    {"id": "battery", "name": "Battery Service"},
+]
+
+MEMBERSHIP_TIERS = [
+    {"tier": "Basic", "price": "$29/mo", "features": ["Basic maintenance reminders", "Service booking", "Email support"]},
+    {"tier": "Premium", "price": "$79/mo", "features": ["White-glove pickup", "AI health predictions", "Priority booking", "Phone support"], "popular": True},
+    {"tier": "Veluxe Elite", "price": "$149/mo", "features": ["All Premium features", "Exclusive events", "24/7 concierge", "Free detailing"]},
+]
+
+class BootstrapSnapshot:
+    # Everything the app needs on load, kept as ready-to-send JSON and gzip bytes.
+    # Event writes re-encode just the event they touch; the body is stitched back
+    # together from the cached pieces on the next read, so a burst of RSVPs costs
+    # one rebuild and serving it needs no query.
+    def __init__(self):
+        self.events: Dict[str, bytes] = {}  # event id -> encoded event
+        self.static = json.dumps(
+            {"service_types": SERVICE_TYPES, "membership_tiers": MEMBERSHIP_TIERS}, separators=(",", ":")
+        ).encode()
+        self.loaded = False
+        self.stale = True
+        self.version = 0
+        self.body = b""
+        self.gzipped = b""
+        self.etag = ""
+
+    async def load(self):
+        events = {}
+        async for event in db.events.find():
+            event = Event.from_mongo(event)
+            events[event["id"]] = self.encode_event(event)
+        self.events = events
+        self.loaded = True
+        self.stale = True
+        self.encode()
+
+    @staticmethod
+    def encode_event(event: dict) -> bytes:
+        return json.dumps(event, separators=(",", ":")).encode()
+
+    def put_event(self, event: dict):
+        self.events[event["id"]] = self.encode_event(event)
+        self.stale = True
+
+    async def refresh_event(self, event_id: str):
+        event = await db.events.find_one({"_id": as_uuid(event_id)})
+        if event:
+            self.put_event(Event.from_mongo(event))
+
+    def encode(self):
+        if not self.stale:
+            return
+        self.version += 1
+        self.body = b"".join([
+            b'{"version":%d,"events":[' % self.version,
+            b",".join(self.events.values()),
+            b"],", self.static[1:]
+        ])
+        self.gzipped = gzip.compress(self.body)
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.stale = False
+
+bootstrap_snapshot = BootstrapSnapshot()
+
+@app.get("/api/bootstrap")
+async def get_bootstrap(request: Request):
+    if not bootstrap_snapshot.loaded:
+        await bootstrap_snapshot.load()
+    bootstrap_snapshot.encode()
+    headers = {"ETag": bootstrap_snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == bootstrap_snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(bootstrap_snapshot.gzipped, media_type="application/json", headers=headers)
+    return Response(bootstrap_snapshot.body, media_type="application/json", headers=headers)
+
+# Event waitlists
+class EventWaitlist:
+    # FIFO queue of user_ids. A Fenwick tree over queue slots counts the live
+    # entries up to each slot, so positions and cancellations are O(log n).
+    def __init__(self):
+        self.tree = [0]
+        self.users: List[Optional[str]] = []  # slot -> user_id, None once removed
+        self.seqs: List[int] = []
+        self.slot_by_user: Dict[str, int] = {}
+        self.head = 0
+        self.last_seq = 0
+
+    def __len__(self):
+        return len(self.slot_by_user)
+
+    def _prefix(self, i: int) -> int:
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _add(self, i: int, delta: int):
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def append(self, user_id: str, seq: Optional[int] = None) -> int:
+        if user_id in self.slot_by_user:
+            return self.position(user_id)
+        self.last_seq = max(self.last_seq, seq) if seq is not None else self.last_seq + 1
+        self.users.append(user_id)
+        self.seqs.append(self.last_seq)
+        i = len(self.users)
+        # tree[i] covers slots (i - lowbit(i), i]; everything but slot i is already counted
+        self.tree.append(1 + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        self.slot_by_user[user_id] = i - 1
+        return self._prefix(i)
+
+    def position(self, user_id: str) -> Optional[int]:
+        slot = self.slot_by_user.get(user_id)
+        if slot is None:
+            return None
+        return self._prefix(slot + 1)
+
+    def seq(self, user_id: str) -> int:
+        return self.seqs[self.slot_by_user[user_id]]
+
+    def remove(self, user_id: str) -> bool:
+        slot = self.slot_by_user.pop(user_id, None)
+        if slot is None:
+            return False
+        self.users[slot] = None
+        self._add(slot + 1, -1)
+        return True
+
+    def peek(self, count: int) -> List[str]:
+        while self.head < len(self.users) and self.users[self.head] is None:
+            self.head += 1
+        front = []
+        slot = self.head
+        while len(front) < count and slot < len(self.users):
+            if self.users[slot] is not None:
+                front.append(self.users[slot])
+            slot += 1
+        return front
+
+    def compact(self):
+        # Drop the removed slots once they make up most of the queue
+        if self.head < 1024 or self.head * 2 < len(self.users):
+            return
+        live = [(user_id, seq) for user_id, seq in zip(self.users, self.seqs) if user_id is not None]
+        last_seq = self.last_seq
+        self.__init__()
+        for user_id, seq in live:
+            self.append(user_id, seq)
+        self.last_seq = last_seq
+
+# Loaded lazily per event; the event_waitlist collection is the source of truth
+waitlists: Dict[str, EventWaitlist] = {}
+
+async def get_waitlist(event_id: str) -> EventWaitlist:
+    waitlist = waitlists.get(event_id)
+    if waitlist is None:
+        loaded = EventWaitlist()
+        async for entry in db.event_waitlist.find({"event_id": as_uuid(event_id)}).sort("seq", ASCENDING):
+            entry = WaitlistEntry.from_mongo(entry)
+            loaded.append(entry["user_id"], entry["seq"])
+        # Another request may have loaded it while we were awaiting
+        waitlist = waitlists.setdefault(event_id, loaded)
+    return waitlist
+
+def new_rsvp(event_id: str, user_id: str) -> dict:
+    return EventRSVP(
+        id=str(uuid.uuid4()),
+        event_id=event_id,
+        user_id=user_id,
+        created_at=datetime.now().isoformat()
+    ).to_mongo()
+
+def new_waitlist_entry(event_id: str, user_id: str, seq: int) -> dict:
+    return WaitlistEntry(
+        id=str(uuid.uuid4()),
+        event_id=event_id,
+        user_id=user_id,
+        seq=seq,
+        created_at=datetime.now().isoformat()
+    ).to_mongo()
+
+def rsvp_filter(event_id: str, user_id: str) -> dict:
+    return {"event_id": as_uuid(event_id), "user_id": as_uuid(user_id)}
+
+async def add_to_waitlist(event_id: str, user_id: str) -> int:
+    waitlist = await get_waitlist(event_id)
+    position = waitlist.append(user_id)
+    try:
+        await db.event_waitlist.insert_one(new_waitlist_entry(event_id, user_id, waitlist.seq(user_id)))
+    except DuplicateKeyError:
+        # Another worker queued this user first; reload to pick up its position
+        waitlists.pop(event_id, None)
+        position = (await get_waitlist(event_id)).position(user_id)
+    return position
+
 @app.post("/api/events/{event_id}/rsvp")
 async def rsvp_event(event_id: str, user_id: str):
     # Check if already RSVP'd
-    existing = await db.event_rsvps.find_one({"event_id": event_id, "user_id": user_id})
+    existing = await db.event_rsvps.find_one(rsvp_filter(event_id, user_id))
     if existing:
         return {"success": True, "message": "Already RSVP'd"}
-    
-    # Add RSVP
-    rsvp = {
-        "id": str(uuid.uuid4()),
-        "event_id": event_id,
-        "user_id": user_id,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    result = await db.event_rsvps.insert_one(rsvp)
-    if result.inserted_id:
-        # Update event attendee count
-        await db.events.update_one(
-            {"id": event_id},
-            {"$inc": {"current_attendees": 1}}
+
+    waitlist = await get_waitlist(event_id)
+    position = waitlist.position(user_id)
+    if position is not None:
+        return {"success": True, "waitlisted": True, "position": position}
+
+    async with read_router.write_session(user_id) as session:
+        # Claim a seat atomically; no match means the event is full (or missing)
+        event = await db.events.find_one_and_update(
+            {"_id": as_uuid(event_id), "$expr": {"$lt": ["$current_attendees", "$max_attendees"]}},
+            {"$inc": {"current_attendees": 1}},
+            session=session,
+            return_document=ReturnDocument.AFTER
         )
-        return {"success": True}
-    
+        if event is None:
+            if not await db.events.find_one({"_id": as_uuid(event_id)}, {"_id": 1}, session=session):
+                raise HTTPException(status_code=404, detail="Event not found")
+            position = await add_to_waitlist(event_id, user_id)
+            return {"success": True, "waitlisted": True, "position": position}
+
+        try:
+            result = await db.event_rsvps.insert_one(new_rsvp(event_id, user_id), session=session)
+        except DuplicateKeyError:
+            await db.events.update_one({"_id": as_uuid(event_id)}, {"$inc": {"current_attendees": -1}}, session=session)
+            return {"success": True, "message": "Already RSVP'd"}
+        if result.inserted_id:
+            bootstrap_snapshot.put_event(Event.from_mongo(event))
+            return {"success": True}
+
     raise HTTPException(status_code=500, detail="Failed to RSVP")
 
+@app.delete("/api/events/{event_id}/rsvp")
+async def cancel_rsvp(event_id: str, user_id: str):
+    waitlist = await get_waitlist(event_id)
+    if waitlist.remove(user_id):
+        await db.event_waitlist.delete_one(rsvp_filter(event_id, user_id))
+        return {"success": True, "message": "Removed from waitlist"}
+
+    # The freed seat goes straight to the front of the waitlist. Take that user off before
+    # awaiting anything, so a concurrent cancel promotes the next one instead of the same one.
+    promoted = waitlist.peek(1)
+    for promoted_user in promoted:
+        waitlist.remove(promoted_user)
+
+    async def cancel(session):
+        result = await db.event_rsvps.delete_one(rsvp_filter(event_id, user_id), session=session)
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="RSVP not found")
+        if promoted:
+            await db.event_rsvps.insert_one(new_rsvp(event_id, promoted[0]), session=session)
+            await db.event_waitlist.delete_one(rsvp_filter(event_id, promoted[0]), session=session)
+        else:
+            await db.events.update_one({"_id": as_uuid(event_id)}, {"$inc": {"current_attendees": -1}}, session=session)
+
+    try:
+        await run_transaction(cancel, user_id)
+    except Exception:
+        # event_waitlist still has whoever was not promoted; reload from it
+        waitlists.pop(event_id, None)
+        raise
+    if not promoted:
+        await bootstrap_snapshot.refresh_event(event_id)
+    waitlist.compact()
+    return {"success": True, "promoted": promoted}
+
+@app.get("/api/events/{event_id}/waitlist/{user_id}")
+async def get_waitlist_position(event_id: str, user_id: str):
+    waitlist = await get_waitlist(event_id)
+    position = waitlist.position(user_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="User is not on the waitlist")
+    return {"event_id": event_id, "user_id": user_id, "position": position, "waitlist_size": len(waitlist)}
+
+@app.post("/api/events/{event_id}/rsvp/bulk")
+async def bulk_rsvp_event(event_id: str, request: BulkRSVPRequest):
+    event = await db.events.find_one({"_id": as_uuid(event_id)})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    waitlist = await get_waitlist(event_id)
+    requested = list(dict.fromkeys(request.user_ids))
+    already = set()
+    rsvp_query = {"event_id": as_uuid(event_id), "user_id": {"$in": [as_uuid(user_id) for user_id in requested]}}
+    async for rsvp in db.event_rsvps.find(rsvp_query, {"user_id": 1}):
+        already.add(EventRSVP.from_mongo(rsvp)["user_id"])
+    new_users = [user_id for user_id in requested if user_id not in already and waitlist.position(user_id) is None]
+
+    seats = max(0, event["max_attendees"] - event["current_attendees"])
+    promoted = waitlist.peek(min(request.promote, seats))
+    confirmed = new_users[:seats - len(promoted)]
+    overflow = new_users[len(confirmed):]
+    overflow_entries = [new_waitlist_entry(event_id, user_id, waitlist.last_seq + i + 1) for i, user_id in enumerate(overflow)]
+    # Off the in-memory waitlist before awaiting, as in cancel_rsvp
+    for user_id in promoted:
+        waitlist.remove(user_id)
+    raced = set()
+
+    async def apply(session):
+        seated = promoted + confirmed
+        if seated:
+            # Claim the seats first, guarded on the count we read so a concurrent RSVP
+            # cannot overbook the event; nothing is written if the guard fails
+            result = await db.events.update_one(
+                {"_id": event["_id"], "current_attendees": event["current_attendees"]},
+                {"$inc": {"current_attendees": len(seated)}},
+                session=session
+            )
+            if result.matched_count == 0:
+                raise HTTPException(status_code=409, detail="Event changed during bulk RSVP, please retry")
+            try:
+                await db.event_rsvps.bulk_write(
+                    [InsertOne(new_rsvp(event_id, user_id)) for user_id in seated],
+                    ordered=False, session=session
+                )
+            except BulkWriteError as e:
+                # Duplicates mean some users RSVP'd on their own in the meantime
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+                if session is not None:
+                    # The transaction is aborted, so nothing was written
+                    raise HTTPException(status_code=409, detail="Event changed during bulk RSVP, please retry")
+                # Without a transaction the other rows are in; hand back the duplicates' seats
+                duplicates = {seated[error["index"]] for error in e.details["writeErrors"]}
+                await db.events.update_one({"_id": event["_id"]}, {"$inc": {"current_attendees": -len(duplicates)}})
+                raced.update(duplicates)
+        waitlist_ops = [DeleteOne(rsvp_filter(event_id, user_id)) for user_id in promoted]
+        waitlist_ops += [InsertOne(entry) for entry in overflow_entries]
+        if waitlist_ops:
+            await db.event_waitlist.bulk_write(waitlist_ops, ordered=False, session=session)
+
+    try:
+        await run_transaction(apply)
+    except Exception:
+        waitlists.pop(event_id, None)
+        raise
+    if promoted or confirmed:
+        await bootstrap_snapshot.refresh_event(event_id)
+    waitlisted = [
+        {"user_id": user_id, "position": waitlist.append(user_id, entry["seq"])}
+        for user_id, entry in zip(overflow, overflow_entries)
+    ]
+    waitlist.compact()
+    return {
+        "success": True,
+        "confirmed": [user_id for user_id in confirmed if user_id not in raced],
+        "promoted": [user_id for user_id in promoted if user_id not in raced],
+        "already_rsvpd": sorted(already | raced),
+        "waitlisted": waitlisted
+    }
+
 @app.post("/api/ai-predictions/{car_id}")
 async def get_ai_predictions(car_id: str):
+    async with admission.slot(await membership_tier(await car_owner(car_id))):
+        return await predict_car_health(car_id)
+
+async def predict_car_health(car_id: str) -> dict:
     # Placeholder for AI predictions - will be replaced with OpenAI integration
     predictions = {
         "overall_health": "Good",
@@ -214,15 +1418,138 @@ async def get_ai_predictions(car_id: str):
     
     # Update car health with AI predictions
     await db.car_health.update_one(
-        {"car_id": car_id},
+        {"_id": as_uuid(car_id)},
         {"$set": {
             "ai_predictions": predictions,
-            "last_updated": datetime.now().isoformat()
+            "last_updated": datetime.now()
         }}
     )
     
     return predictions
 
+# Maintenance alerts
+MAINTENANCE_INTERVALS = {
+    "oil_change_due": timedelta(days=180),
+    "brake_inspection": timedelta(days=365),
+    "tire_rotation": timedelta(days=120),
+    "battery_check": timedelta(days=365),
+}
+
+def maintenance_due_dates(last_service_date: str) -> Dict[str, datetime]:
+    last_service = as_datetime(last_service_date)
+    return {alert_type: last_service + interval for alert_type, interval in MAINTENANCE_INTERVALS.items()}
+
+def maintenance_schedule(due: Dict[str, datetime]) -> dict:
+    # The car_health fields the scheduler works from; next_due_at is the earliest item
+    # that has not alerted yet
+    return {"maintenance_due": due, "next_due_at": min(due.values())}
+
+async def record_service(car_id: uuid.UUID, service_date: datetime, session=None):
+    # A service restarts every maintenance interval from its date. Older dates are
+    # ignored so completing bookings out of order cannot move the schedule back.
+    result = await db.cars.update_one(
+        {"_id": car_id, "last_service_date": {"$lt": service_date}},
+        {"$set": {"last_service_date": service_date}},
+        session=session
+    )
+    if result.modified_count:
+        await db.car_health.update_one(
+            {"_id": car_id},
+            {"$set": maintenance_schedule(maintenance_due_dates(service_date))},
+            session=session
+        )
+
+class MaintenanceScheduler:
+    # Each run only reads cars whose next_due_at has passed. Every item that fired is
+    # moved on by its interval, so alerts recur, and next_due_at follows the earliest.
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.last_run: Optional[dict] = None
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now()
+        started = time.perf_counter()
+        cars = alerts_created = 0
+        while True:
+            batch = await db.car_health.find(
+                {"next_due_at": {"$lte": now}},
+                {"maintenance_due": 1, "next_due_at": 1}
+            ).sort("next_due_at", ASCENDING).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+
+            alerts, updates = [], []
+            for health in batch:
+                due = {
+                    alert_type: due_at for alert_type, due_at in health.get("maintenance_due", {}).items()
+                    if alert_type in MAINTENANCE_INTERVALS
+                }
+                for alert_type, due_at in due.items():
+                    if due_at > now:
+                        continue
+                    alerts.append(MaintenanceAlert(
+                        id=str(uuid.uuid4()),
+                        car_id=str(health["_id"]),
+                        alert_type=alert_type,
+                        due_at=due_at.isoformat(),
+                        created_at=now.isoformat()
+                    ).to_mongo())
+                    # Skip the periods that went by unserviced, they would only alert again
+                    while due_at <= now:
+                        due_at += MAINTENANCE_INTERVALS[alert_type]
+                    due[alert_type] = due_at
+                updates.append(UpdateOne(
+                    # Skip the car if something else moved its schedule meanwhile
+                    {"_id": health["_id"], "next_due_at": health["next_due_at"]},
+                    {"$set": maintenance_schedule(due)} if due else {"$unset": {"next_due_at": ""}}
+                ))
+
+            if alerts:
+                try:
+                    await db.maintenance_alerts.insert_many(alerts, ordered=False)
+                except BulkWriteError as e:
+                    # Alerts left behind by an interrupted run are already there
+                    if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                        raise
+            await db.car_health.bulk_write(updates, ordered=False)
+            cars += len(batch)
+            alerts_created += len(alerts)
+            if len(batch) < self.batch_size:
+                break
+
+        self.last_run = {
+            "at": now.isoformat(),
+            "cars": cars,
+            "alerts": alerts_created,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        return alerts_created
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Maintenance scheduler run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+maintenance_scheduler = MaintenanceScheduler(
+    interval_seconds=float(os.environ.get('MAINTENANCE_SCAN_INTERVAL_SECONDS', '300')),
+    batch_size=int(os.environ.get('MAINTENANCE_SCAN_BATCH_SIZE', '500'))
+)
+
+@app.get("/api/maintenance-alerts/car/{car_id}")
+async def get_car_maintenance_alerts(car_id: str):
+    alerts = []
+    async for alert in read_db.maintenance_alerts.find({"car_id": as_uuid(car_id)}).sort("due_at", ASCENDING):
+        alerts.append(MaintenanceAlert.from_mongo(alert))
+    return alerts
+
+@app.get("/api/debug/maintenance-scheduler")
+async def get_maintenance_scheduler_status():
+    return {"last_run": maintenance_scheduler.last_run, "interval_seconds": maintenance_scheduler.interval_seconds}
+
 # Initialize sample data
 @app.get("/api/debug/init-events")
 async def init_sample_events():
@@ -269,13 +1596,35 @@ async def init_sample_events():
     for event in sample_events:
         existing = await db.events.find_one({"title": event["title"]})
         if not existing:
-            await db.events.insert_one(event)
+            await db.events.insert_one(Event(**event).to_mongo())
             inserted_count += 1
+    if inserted_count:
+        await bootstrap_snapshot.load()
     
     return {"success": True, "message": f"Initialized {inserted_count} sample events"}
 
-@app.on_event("startup")
-async def startup_event():
+@app.get("/api/debug/query-audit")
+async def get_query_audit():
+    """Debug endpoint that explains every query recorded since startup (needs QUERY_AUDIT=1)"""
+    if query_auditor is None:
+        return {"enabled": False, "queries": [], "violations": []}
+    queries = await query_auditor.explain(db.database)
+    return {
+        "enabled": True,
+        "queries": queries,
+        "violations": [query for query in queries if query["problems"]]
+    }
+
+@app.get("/api/debug/admission")
+async def get_admission_metrics():
+    return admission.report()
+
+@app.get("/api/debug/startup-profile")
+async def get_startup_profile():
+    return startup_profiler.report()
+
+# on_event handlers are skipped when the app has a lifespan, so this runs from lifespan()
+async def seed_sample_events():
     # Create sample events
     sample_events = [
         {
@@ -317,8 +1666,13 @@ async def startup_event():
     for event in sample_events:
         existing = await db.events.find_one({"title": event["title"]})
         if not existing:
-            await db.events.insert_one(event)
+            await db.events.insert_one(Event(**event).to_mongo())
+
+startup_profiler.record("import:server", BOOT_STARTED)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if "--maintenance-worker" in sys.argv:
+        asyncio.run(maintenance_scheduler.run_forever())
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
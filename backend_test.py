@@ -3,9 +3,12 @@ import requests
 import json
 import time
 import random
+import uuid
 from datetime import datetime, timedelta
 import os
 import sys
+import subprocess
+import asyncio
 
 # Get the backend URL from the frontend .env file
 def get_backend_url():
@@ -23,6 +26,20 @@ if not BACKEND_URL:
 API_URL = f"{BACKEND_URL}/api"
 print(f"Using API URL: {API_URL}")
 
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+# Import server.py in this process, pointed at the same database as the running backend
+def import_backend():
+    with open(os.path.join(BACKEND_DIR, ".env"), "r") as f:
+        for line in f:
+            name, _, value = line.strip().partition("=")
+            if name:
+                os.environ.setdefault(name, value.strip('"\''))
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import server
+    return server
+
 # Test data for luxury cars
 CAR_BRANDS = ["Mercedes", "Porsche", "Tesla", "BMW"]
 CAR_MODELS = {
@@ -31,6 +48,8 @@ CAR_MODELS = {
     "Tesla": ["Model S", "Model 3", "Model X", "Model Y"],
     "BMW": ["7 Series", "5 Series", "X5", "i8"]
 }
+# Import plus lifespan startup must stay under this, in milliseconds
+COLD_START_BUDGET_MS = float(os.environ.get("COLD_START_BUDGET_MS", "2000"))
 CAR_COLORS = ["Black", "White", "Silver", "Midnight Blue", "British Racing Green", "Burgundy"]
 
 # Helper function to generate a random VIN
@@ -86,6 +105,32 @@ def test_health_check():
     except Exception as e:
         return format_result("Health Check", False, error=str(e))
 
+def test_cold_start_budget():
+    try:
+        # Import the server in a fresh interpreter so no module is already cached
+        script = "import json, server; print(json.dumps(server.startup_profiler.report()))"
+        completed = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60)
+        if completed.returncode != 0:
+            return format_result("Cold Start Budget", False, error=completed.stderr)
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        success = report["total_ms"] <= COLD_START_BUDGET_MS and not report["heavy_modules_loaded"]
+        return format_result("Cold Start Budget", success, report)
+    except Exception as e:
+        return format_result("Cold Start Budget", False, error=str(e))
+
+def test_startup_profile():
+    try:
+        response = requests.get(f"{API_URL}/debug/startup-profile")
+        report = response.json() if response.status_code == 200 else {}
+        success = (
+            report.get("ready") == True
+            and report.get("total_ms", float("inf")) <= COLD_START_BUDGET_MS
+            and not report.get("heavy_modules_loaded")
+        )
+        return format_result("Startup Profile", success, response)
+    except Exception as e:
+        return format_result("Startup Profile", False, error=str(e))
+
 def test_create_user():
     try:
         user_data = {
@@ -151,6 +196,15 @@ def test_get_user_cars(user_id):
     except Exception as e:
         return format_result(f"Get User Cars (User ID: {user_id})", False, error=str(e))
 
+def test_get_user_cars_with_health(user_id, car_id):
+    try:
+        response = requests.get(f"{API_URL}/cars/user/{user_id}?include_health=true")
+        cars = response.json() if response.status_code == 200 else []
+        success = any(car.get("id") == car_id and (car.get("health") or {}).get("car_id") == car_id for car in cars)
+        return format_result(f"Get User Cars With Health (User ID: {user_id})", success, response)
+    except Exception as e:
+        return format_result(f"Get User Cars With Health (User ID: {user_id})", False, error=str(e))
+
 def test_get_car_health(car_id):
     try:
         response = requests.get(f"{API_URL}/car-health/{car_id}")
@@ -167,6 +221,81 @@ def test_get_ai_predictions(car_id):
     except Exception as e:
         return format_result(f"Get AI Predictions (Car ID: {car_id})", False, error=str(e))
 
+def test_admission_metrics():
+    try:
+        response = requests.get(f"{API_URL}/debug/admission")
+        tiers = response.json().get("tiers", {}) if response.status_code == 200 else {}
+        success = set(tiers) == {"Veluxe Elite", "Premium", "Basic"} and sum(t["admitted"] for t in tiers.values()) > 0
+        return format_result("Admission Metrics", success, response)
+    except Exception as e:
+        return format_result("Admission Metrics", False, error=str(e))
+
+def test_get_maintenance_alerts(car_id):
+    try:
+        response = requests.get(f"{API_URL}/maintenance-alerts/car/{car_id}")
+        success = response.status_code == 200 and isinstance(response.json(), list)
+        return format_result(f"Get Maintenance Alerts (Car ID: {car_id})", success, response)
+    except Exception as e:
+        return format_result(f"Get Maintenance Alerts (Car ID: {car_id})", False, error=str(e))
+
+def test_maintenance_scheduler():
+    # Runs the scheduler directly against a car whose items are all overdue; the
+    # backend itself only scans every MAINTENANCE_SCAN_INTERVAL_SECONDS
+    try:
+        server = import_backend()
+
+        async def scenario():
+            car_id = uuid.uuid4()
+            now = datetime.now().replace(microsecond=0)
+            last_service = (now - timedelta(days=400)).strftime("%Y-%m-%d")
+            schedule = server.maintenance_schedule(server.maintenance_due_dates(last_service))
+            await server.db.car_health.insert_one({"_id": car_id, **schedule})
+            try:
+                scheduler = server.MaintenanceScheduler(interval_seconds=0, batch_size=100)
+                await scheduler.run_once(now=now)
+                first = await server.db.maintenance_alerts.count_documents({"car_id": car_id})
+                await scheduler.run_once(now=now)
+                second = await server.db.maintenance_alerts.count_documents({"car_id": car_id})
+                health = await server.db.car_health.find_one({"_id": car_id})
+            finally:
+                await server.db.car_health.delete_one({"_id": car_id})
+                await server.db.maintenance_alerts.delete_many({"car_id": car_id})
+            return now, schedule, first, second, health
+
+        # One event loop for the whole scenario, as the Motor client binds to it
+        now, schedule, first, second, health = asyncio.run(scenario())
+        success = (
+            first == len(server.MAINTENANCE_INTERVALS)
+            and second == first
+            and health["next_due_at"] > now
+            and health["next_due_at"] > schedule["next_due_at"]
+            and all(due_at > now for due_at in health["maintenance_due"].values())
+        )
+        return format_result("Maintenance Scheduler", success, {
+            "alerts_first_run": first,
+            "alerts_after_second_run": second,
+            "next_due_at": health["next_due_at"].isoformat()
+        })
+    except Exception as e:
+        return format_result("Maintenance Scheduler", False, error=str(e))
+
+def test_read_your_writes(user_id):
+    # Against a replica set with MONGO_READ_PREFERENCE=secondaryPreferred, a fresh write must
+    # still be visible to the same user right away
+    try:
+        for _ in range(5):
+            car_result = test_add_car(user_id)
+            if not car_result["success"]:
+                return format_result("Read Your Writes", False, error="Car addition failed")
+            car_id = car_result["car_id"]
+            cars = requests.get(f"{API_URL}/cars/user/{user_id}").json()
+            health = requests.get(f"{API_URL}/car-health/{car_id}?user_id={user_id}")
+            if car_id not in [car.get("id") for car in cars] or health.status_code != 200:
+                return format_result("Read Your Writes", False, error=f"Car {car_id} not visible after write")
+        return format_result("Read Your Writes", True)
+    except Exception as e:
+        return format_result("Read Your Writes", False, error=str(e))
+
 def test_create_booking(user_id, car_id):
     try:
         # Generate a date 1-14 days in the future
@@ -199,6 +328,32 @@ def test_create_booking(user_id, car_id):
     except Exception as e:
         return format_result("Create Booking", False, error=str(e))
 
+def test_idempotent_booking(user_id, car_id):
+    try:
+        booking_data = {
+            "user_id": user_id,
+            "car_id": car_id,
+            "service_type": "Full Inspection",
+            "pickup_type": "white-glove",
+            "appointment_date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"),
+            "appointment_time": "10:00",
+            "special_instructions": "Retried by a flaky mobile network"
+        }
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        first = requests.post(f"{API_URL}/bookings", json=booking_data, headers=headers)
+        retry = requests.post(f"{API_URL}/bookings", json=booking_data, headers=headers)
+        booking_id = first.json().get("booking_id") if first.status_code == 200 else None
+        bookings = requests.get(f"{API_URL}/bookings/user/{user_id}").json()
+        success = (
+            booking_id is not None
+            and retry.status_code == 200
+            and retry.json().get("booking_id") == booking_id
+            and [booking.get("id") for booking in bookings].count(booking_id) == 1
+        )
+        return format_result("Idempotent Booking Retry", success, retry)
+    except Exception as e:
+        return format_result("Idempotent Booking Retry", False, error=str(e))
+
 def test_get_user_bookings(user_id):
     try:
         response = requests.get(f"{API_URL}/bookings/user/{user_id}")
@@ -220,6 +375,23 @@ def test_get_events():
     except Exception as e:
         return format_result("Get Events", False, error=str(e))
 
+def test_get_bootstrap():
+    try:
+        response = requests.get(f"{API_URL}/bootstrap")
+        data = response.json() if response.status_code == 200 else {}
+        etag = response.headers.get("ETag")
+        revalidated = requests.get(f"{API_URL}/bootstrap", headers={"If-None-Match": etag}) if etag else None
+        success = (
+            len(data.get("events", [])) > 0
+            and len(data.get("service_types", [])) > 0
+            and len(data.get("membership_tiers", [])) > 0
+            and revalidated is not None
+            and revalidated.status_code == 304
+        )
+        return format_result("Get App Bootstrap", success, {"version": data.get("version"), "events": len(data.get("events", []))})
+    except Exception as e:
+        return format_result("Get App Bootstrap", False, error=str(e))
+
 def test_rsvp_event(event_id, user_id):
     try:
         # Add user_id as a query parameter
@@ -229,6 +401,104 @@ def test_rsvp_event(event_id, user_id):
     except Exception as e:
         return format_result(f"RSVP to Event (Event ID: {event_id})", False, error=str(e))
 
+def test_cancel_rsvp(event_id, user_id):
+    try:
+        response = requests.delete(f"{API_URL}/events/{event_id}/rsvp?user_id={user_id}")
+        # The RSVP is gone, so cancelling it again finds nothing
+        again = requests.delete(f"{API_URL}/events/{event_id}/rsvp?user_id={user_id}")
+        success = response.status_code == 200 and response.json().get("success") == True and again.status_code == 404
+        return format_result(f"Cancel RSVP (Event ID: {event_id})", success, response)
+    except Exception as e:
+        return format_result(f"Cancel RSVP (Event ID: {event_id})", False, error=str(e))
+
+def test_bulk_rsvp_event(event_id):
+    try:
+        user_ids = [str(uuid.uuid4()) for _ in range(3)]
+        response = requests.post(f"{API_URL}/events/{event_id}/rsvp/bulk", json={"user_ids": user_ids})
+        data = response.json() if response.status_code == 200 else {}
+        seated = set(data.get("confirmed", [])) | {entry["user_id"] for entry in data.get("waitlisted", [])}
+        success = response.status_code == 200 and seated == set(user_ids)
+        return format_result(f"Bulk RSVP to Event (Event ID: {event_id})", success, response)
+    except Exception as e:
+        return format_result(f"Bulk RSVP to Event (Event ID: {event_id})", False, error=str(e))
+
+def test_waitlist_promotion():
+    # Fill an event, waitlist two users, then free a seat: the first in line must get it
+    event_id, users = None, []
+    try:
+        events = requests.get(f"{API_URL}/events").json()
+        # Users are only waitlisted once an event is full, so one with free seats has an empty waitlist
+        event = next(event for event in events if event["current_attendees"] < event["max_attendees"])
+        event_id = event["id"]
+        fillers = [str(uuid.uuid4()) for _ in range(event["max_attendees"] - event["current_attendees"])]
+        first, second = str(uuid.uuid4()), str(uuid.uuid4())
+        users = fillers + [first, second]
+
+        filled = requests.post(f"{API_URL}/events/{event_id}/rsvp/bulk", json={"user_ids": users}).json()
+        positions = [
+            requests.get(f"{API_URL}/events/{event_id}/waitlist/{user_id}").json().get("position")
+            for user_id in (first, second)
+        ]
+        cancelled = requests.delete(f"{API_URL}/events/{event_id}/rsvp?user_id={fillers[0]}").json()
+        users.remove(fillers[0])
+        after = next(event for event in requests.get(f"{API_URL}/events").json() if event["id"] == event_id)
+        second_position = requests.get(f"{API_URL}/events/{event_id}/waitlist/{second}").json().get("position")
+        first_on_waitlist = requests.get(f"{API_URL}/events/{event_id}/waitlist/{first}").status_code
+
+        success = (
+            filled.get("confirmed") == fillers
+            and filled.get("waitlisted") == [{"user_id": first, "position": 1}, {"user_id": second, "position": 2}]
+            and positions == [1, 2]
+            and cancelled.get("promoted") == [first]
+            and after["current_attendees"] == after["max_attendees"]
+            and second_position == 1
+            and first_on_waitlist == 404
+        )
+        return format_result(f"Waitlist Promotion (Event ID: {event_id})", success, {
+            "waitlisted": filled.get("waitlisted"),
+            "positions": positions,
+            "promoted": cancelled.get("promoted"),
+            "current_attendees": after["current_attendees"],
+            "second_position_after_promotion": second_position
+        })
+    except Exception as e:
+        return format_result(f"Waitlist Promotion (Event ID: {event_id})", False, error=str(e))
+    finally:
+        # Leave the event as we found it; the waitlisted user goes first so nobody else is promoted
+        for user_id in reversed(users):
+            requests.delete(f"{API_URL}/events/{event_id}/rsvp?user_id={user_id}")
+
+def test_rate_limit():
+    # /debug/init-events allows a burst of 2 per client, /health has no rule at all
+    try:
+        origin = {"Origin": "http://localhost:3000"}
+        limited = [requests.get(f"{API_URL}/debug/init-events", headers=origin) for _ in range(3)][-1]
+        unlimited = [requests.get(f"{API_URL}/health").status_code for _ in range(30)]
+        success = (
+            limited.status_code == 429
+            and int(limited.headers.get("Retry-After", "0")) >= 1
+            and limited.headers.get("Access-Control-Allow-Origin") is not None
+            and "retry-after" in limited.headers.get("Access-Control-Expose-Headers", "").lower()
+            and all(status == 200 for status in unlimited)
+        )
+        return format_result("Rate Limit", success, {
+            "status": limited.status_code,
+            "headers": dict(limited.headers),
+            "unlimited_statuses": sorted(set(unlimited))
+        })
+    except Exception as e:
+        return format_result("Rate Limit", False, error=str(e))
+
+def test_query_audit():
+    # Needs the backend started with QUERY_AUDIT=1 so it records the queries issued above
+    try:
+        response = requests.get(f"{API_URL}/debug/query-audit")
+        data = response.json() if response.status_code == 200 else {}
+        success = data.get("enabled") == True and len(data.get("queries", [])) > 0 and not data.get("violations")
+        return format_result("Query Explain Audit", success, {"violations": data.get("violations"), "queries": len(data.get("queries", []))})
+    except Exception as e:
+        return format_result("Query Explain Audit", False, error=str(e))
+
 def run_all_tests():
     print("\n🔍 VELUXE BACKEND API TESTING 🔍\n")
     print(f"Testing against API URL: {API_URL}\n")
@@ -244,6 +514,15 @@ def run_all_tests():
         print("❌ Health check failed. Aborting remaining tests.")
         return results
     
+    # Test cold start against the budget
+    cold_start_result = test_cold_start_budget()
+    results.append(cold_start_result)
+    print_result(cold_start_result)
+    
+    startup_profile_result = test_startup_profile()
+    results.append(startup_profile_result)
+    print_result(startup_profile_result)
+    
     # Test user creation and retrieval
     user_result = test_create_user()
     results.append(user_result)
@@ -273,6 +552,10 @@ def run_all_tests():
         results.append(get_cars_result)
         print_result(get_cars_result)
         
+        cars_with_health_result = test_get_user_cars_with_health(user_id, car_id)
+        results.append(cars_with_health_result)
+        print_result(cars_with_health_result)
+        
         # Test car health and AI predictions
         car_health_result = test_get_car_health(car_id)
         results.append(car_health_result)
@@ -282,11 +565,31 @@ def run_all_tests():
         results.append(ai_predictions_result)
         print_result(ai_predictions_result)
         
+        admission_result = test_admission_metrics()
+        results.append(admission_result)
+        print_result(admission_result)
+        
+        maintenance_alerts_result = test_get_maintenance_alerts(car_id)
+        results.append(maintenance_alerts_result)
+        print_result(maintenance_alerts_result)
+        
+        maintenance_scheduler_result = test_maintenance_scheduler()
+        results.append(maintenance_scheduler_result)
+        print_result(maintenance_scheduler_result)
+        
+        read_your_writes_result = test_read_your_writes(user_id)
+        results.append(read_your_writes_result)
+        print_result(read_your_writes_result)
+        
         # Test booking creation and retrieval
         booking_result = test_create_booking(user_id, car_id)
         results.append(booking_result)
         print_result(booking_result)
         
+        idempotent_booking_result = test_idempotent_booking(user_id, car_id)
+        results.append(idempotent_booking_result)
+        print_result(idempotent_booking_result)
+        
         get_bookings_result = test_get_user_bookings(user_id)
         results.append(get_bookings_result)
         print_result(get_bookings_result)
@@ -296,6 +599,10 @@ def run_all_tests():
     results.append(events_result)
     print_result(events_result)
     
+    bootstrap_result = test_get_bootstrap()
+    results.append(bootstrap_result)
+    print_result(bootstrap_result)
+    
     if not events_result["success"] or "event_id" not in events_result:
         print("❌ Events retrieval failed. Skipping RSVP test.")
     else:
@@ -304,6 +611,29 @@ def run_all_tests():
         rsvp_result = test_rsvp_event(event_id, user_id)
         results.append(rsvp_result)
         print_result(rsvp_result)
+        
+        cancel_rsvp_result = test_cancel_rsvp(event_id, user_id)
+        results.append(cancel_rsvp_result)
+        print_result(cancel_rsvp_result)
+        
+        bulk_rsvp_result = test_bulk_rsvp_event(event_id)
+        results.append(bulk_rsvp_result)
+        print_result(bulk_rsvp_result)
+        
+        waitlist_result = test_waitlist_promotion()
+        results.append(waitlist_result)
+        print_result(waitlist_result)
+    
+    # Last, as it uses up this client's init-events burst
+    rate_limit_result = test_rate_limit()
+    results.append(rate_limit_result)
+    print_result(rate_limit_result)
+    
+    # Explain every query the flow above issued
+    if os.environ.get("QUERY_AUDIT"):
+        query_audit_result = test_query_audit()
+        results.append(query_audit_result)
+        print_result(query_audit_result)
     
     # Print summary
     total_tests = len(results)
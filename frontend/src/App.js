@@ -156,6 +156,8 @@ function App() {
     }
   });
   const [events, setEvents] = useState([]);
+  const [serviceTypes, setServiceTypes] = useState([]);
+  const [membershipTiers, setMembershipTiers] = useState([]);
 
   useEffect(() => {
     fetchEvents();
@@ -163,9 +165,12 @@ function App() {
 
   const fetchEvents = async () => {
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/events`);
+      // Precomputed snapshot; unchanged refreshes come back as 304 via its ETag
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/bootstrap`);
       const data = await response.json();
-      setEvents(data);
+      setEvents(data.events);
+      setServiceTypes(data.service_types);
+      setMembershipTiers(data.membership_tiers);
     } catch (error) {
       console.error('Error fetching events:', error);
     }
@@ -267,12 +272,9 @@ function App() {
           onChange={(e) => setSelectedService(e.target.value)}
           className="w-full bg-gray-800 border border-gray-600 text-white p-3 rounded-lg focus:border-yellow-400 focus:outline-none"
         >
-          <option value="maintenance">General Maintenance</option>
-          <option value="detailing">Premium Detailing</option>
-          <option value="tire-change">Tire Change/Rotation</option>
-          <option value="oil-change">Oil Change</option>
-          <option value="brake-service">Brake Service</option>
-          <option value="battery">Battery Service</option>
+          {serviceTypes.map((service) => (
+            <option key={service.id} value={service.id}>{service.name}</option>
+          ))}
         </select>
       </div>
 
@@ -384,22 +386,15 @@ function App() {
 
       {/* Membership Tiers */}
       <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
-        <MembershipCard 
-          tier="Basic"
-          price="$29/mo"
-          features={["Basic maintenance reminders", "Service booking", "Email support"]}
-        />
-        <MembershipCard 
-          tier="Premium"
-          price="$79/mo"
-          features={["White-glove pickup", "AI health predictions", "Priority booking", "Phone support"]}
-          isPopular={true}
-        />
-        <MembershipCard 
-          tier="Veluxe Elite"
-          price="$149/mo"
-          features={["All Premium features", "Exclusive events", "24/7 concierge", "Free detailing"]}
-        />
+        {membershipTiers.map((membership) => (
+          <MembershipCard 
+            key={membership.tier}
+            tier={membership.tier}
+            price={membership.price}
+            features={membership.features}
+            isPopular={membership.popular}
+          />
+        ))}
       </div>
 
       {/* Settings */}